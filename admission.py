@@ -0,0 +1,146 @@
+import os
+import time
+import hashlib
+import multiprocessing
+
+# --- LIMITS (shared by all gunicorn workers) ---
+SENDER_RATE_PER_MIN = float(os.environ.get("SENDER_RATE_PER_MIN", 6))   # sustained messages per sender
+SENDER_BURST = float(os.environ.get("SENDER_BURST", 3))                 # back-to-back messages allowed
+MAX_INFLIGHT_LLM = int(os.environ.get("MAX_INFLIGHT_LLM", 8))           # concurrent OpenRouter calls
+NOTICE_COOLDOWN_SEC = 60     # Tell a rejected sender at most once a minute
+BUCKET_SLOTS = 16384         # Fixed-size bucket table; colliding senders share a bucket
+
+ADMITTED = "admitted"
+RATE_LIMITED = "rate_limited"
+OVERLOADED = "overloaded"
+
+# Canned replies (no LLM call)
+RATE_LIMITED_REPLY = "မက်ဆေ့ချ် အများကြီး တစ်ပြိုင်နက် ရောက်လာလို့ ခဏလေး စောင့်ပြီးမှ ပြန်မေးပေးပါခင်ဗျာ။ 🙏"
+OVERLOADED_REPLY = "အခု မေးမြန်းသူ အရမ်းများနေလို့ မိနစ်အနည်းငယ်နေမှ ပြန်မေးပေးပါခင်ဗျာ။ 🙏"
+
+# --- SHARED STATE ---
+# Allocated at import. gunicorn imports the app in the master (preload_app = True),
+# so every forked worker inherits the same shared memory and lock.
+# time.monotonic() is system-wide on Linux, so timestamps are comparable across workers.
+_lock = multiprocessing.Lock()
+_keys = multiprocessing.RawArray("Q", BUCKET_SLOTS)            # sender hash, 0 = empty
+_tokens = multiprocessing.RawArray("d", BUCKET_SLOTS)
+_updated = multiprocessing.RawArray("d", BUCKET_SLOTS)
+_notified_at = multiprocessing.RawArray("d", BUCKET_SLOTS)
+# In-flight LLM calls: the pid holding each slot, 0 = free.
+# The gunicorn master reclaims a dead worker's slots (child_exit hook, see gunicorn.conf.py).
+_slot_pids = multiprocessing.RawArray("q", MAX_INFLIGHT_LLM)
+
+_COUNTERS = [ADMITTED, RATE_LIMITED, OVERLOADED, "notices_sent", "reclaimed"]
+_counters = multiprocessing.RawArray("q", len(_COUNTERS))
+
+def _count(name, delta=1):
+    _counters[_COUNTERS.index(name)] += delta
+
+def _counter(name):
+    return _counters[_COUNTERS.index(name)]
+
+def _in_flight():
+    return sum(1 for pid in _slot_pids if pid)
+
+def _slot(sender_id):
+    """Returns (slot, key) for a sender. Caller holds _lock."""
+    digest = hashlib.blake2b(str(sender_id).encode("utf-8"), digest_size=8).digest()
+    key = int.from_bytes(digest, "little") | 1
+    return key % BUCKET_SLOTS, key
+
+def _bucket(sender_id, now):
+    """Finds (or claims) this sender's bucket and refills it. Caller holds _lock."""
+    slot, key = _slot(sender_id)
+    if not _keys[slot]:
+        _tokens[slot] = SENDER_BURST
+        _updated[slot] = now
+        _notified_at[slot] = 0.0
+    # On a collision the new sender inherits the bucket as-is (never a fresh burst),
+    # so alternating senders can't reset each other's limits.
+    _keys[slot] = key
+    rate = SENDER_RATE_PER_MIN / 60.0
+    _tokens[slot] = min(SENDER_BURST, _tokens[slot] + (now - _updated[slot]) * rate)
+    _updated[slot] = now
+    return slot
+
+def admit(sender_id):
+    """
+    Decides whether a message may be queued for the LLM.
+    Checks the global in-flight cap first, so an overloaded reply never costs the sender a token.
+    The LLM slot itself is taken later by acquire_slot(), when the call actually starts.
+    """
+    now = time.monotonic()
+    with _lock:
+        if _in_flight() >= MAX_INFLIGHT_LLM:
+            _count(OVERLOADED)
+            return OVERLOADED
+
+        slot = _bucket(sender_id, now)
+        if _tokens[slot] < 1:
+            _count(RATE_LIMITED)
+            return RATE_LIMITED
+
+        _tokens[slot] -= 1
+        _count(ADMITTED)
+        return ADMITTED
+
+def acquire_slot():
+    """Takes an in-flight LLM slot without waiting. Returns its index, or None if all are busy."""
+    pid = os.getpid()
+    with _lock:
+        for i, holder in enumerate(_slot_pids):
+            if not holder:
+                _slot_pids[i] = pid
+                return i
+        _count(OVERLOADED)
+        return None
+
+def release(slot):
+    """Returns the LLM slot taken by acquire_slot()."""
+    with _lock:
+        if _slot_pids[slot] == os.getpid():
+            _slot_pids[slot] = 0
+
+def reclaim(pid):
+    """Frees the slots held by a worker that died mid-call. Returns how many were freed."""
+    with _lock:
+        freed = 0
+        for i, holder in enumerate(_slot_pids):
+            if holder == pid:
+                _slot_pids[i] = 0
+                freed += 1
+        _count("reclaimed", freed)
+        return freed
+
+def refund(sender_id):
+    """Gives back the token spent in admit() when the message never reached the LLM."""
+    now = time.monotonic()
+    with _lock:
+        slot = _bucket(sender_id, now)
+        _tokens[slot] = min(SENDER_BURST, _tokens[slot] + 1)
+
+def overload_reply(sender_id, decision):
+    """Canned reply for a rejected message, or None if this sender was already told recently."""
+    now = time.monotonic()
+    with _lock:
+        slot = _bucket(sender_id, now)
+        if _notified_at[slot] and now - _notified_at[slot] < NOTICE_COOLDOWN_SEC:
+            return None
+        _notified_at[slot] = now
+        _count("notices_sent")
+    return OVERLOADED_REPLY if decision == OVERLOADED else RATE_LIMITED_REPLY
+
+def stats():
+    """Counters shared by all workers."""
+    with _lock:
+        return {
+            **{name: _counter(name) for name in _COUNTERS},
+            "in_flight": _in_flight(),
+            "tracked_senders": sum(1 for k in _keys if k),
+            "limits": {
+                "sender_rate_per_min": SENDER_RATE_PER_MIN,
+                "sender_burst": SENDER_BURST,
+                "max_inflight_llm": MAX_INFLIGHT_LLM,
+            },
+        }
@@ -1,5 +1,5 @@
 import math
-from database import get_db_connection
+from catalog import get_rows
 
 def calculate_system(watts: int, hours: int, no_solar: bool = False):
     """
@@ -46,100 +46,90 @@ def calculate_system(watts: int, hours: int, no_solar: bool = False):
             if inverter_required_w < 5000:
                 inverter_required_w = 5000 
 
-    # --- 4. DATABASE LOOKUP ---
+    # --- 4. CATALOG LOOKUP ---
+    # The catalog is held in memory (see catalog.py), so no DB round-trip here.
     market_set_found = None
 
-    with get_db_connection() as conn:
-        with conn.cursor() as cur:
-            
-            # STRATEGY A: MARKET PACKAGE
-            cur.execute("""
-                SELECT name, total_price_mmk, description, inverter_watts, battery_kwh, includes_panels 
-                FROM market_packages 
-                WHERE inverter_watts >= %s 
-                AND battery_kwh >= %s
-                AND system_voltage = %s
-                ORDER BY total_price_mmk ASC
-                LIMIT 1
-            """, (inverter_required_w, required_battery_kwh, system_voltage)) 
-            
-            pkg_row = cur.fetchone()
-            # Logic: If user wants no_solar, but package has panels, we skip unless specific flag logic is added.
-            # Here we accept the package if it fits specs, assuming panels can be unbundled or user accepts.
-            if pkg_row:
-                market_set_found = {
-                    "name": pkg_row[0],
-                    "price": pkg_row[1],
-                    "desc": pkg_row[2],
-                    "inv_w": pkg_row[3],
-                    "bat_kwh": pkg_row[4],
-                    "has_panels": pkg_row[5]
-                }
-
-            # STRATEGY B: CUSTOM BUILD
-            
-            # 1. SNAP INVERTER
-            cur.execute("""
-                SELECT watts, price_mmk, brand, model, max_ac_charge_amps 
-                FROM products_inverters 
-                WHERE system_voltage = %s 
-                AND watts >= %s 
-                AND max_ac_charge_amps >= %s
-                ORDER BY price_mmk ASC 
-                LIMIT 1
-            """, (system_voltage, inverter_required_w, min_charge_amps))
-            
-            inv_row = cur.fetchone()
-            
-            if inv_row:
-                real_inverter = {
-                    "watts": inv_row[0],
-                    "price": float(inv_row[1]),
-                    "name": f"{inv_row[2]} {inv_row[3]}",
-                    "charge_amps": inv_row[4]
-                }
-            else:
-                real_inverter = {
-                    "watts": inverter_required_w,
-                    "price": inverter_required_w * 300, 
-                    "name": "Industrial/Parallel Setup",
-                    "charge_amps": 100
-                }
-
-            # 2. SNAP BATTERY
-            # [CORRECTION] Voltage Logic Fix:
-            # We strictly check voltage range to avoid 48V Battery on 24V Inverter.
-            voltage_upper_bound = system_voltage + 4 # Allow small variance (e.g. 51.2 vs 48)
-            
-            cur.execute("""
-                SELECT price_mmk, kwh, brand, model, volts 
-                FROM products_batteries 
-                WHERE volts >= %s AND volts < %s
-                AND tech_type = 'LiFePO4' 
-                ORDER BY price_mmk ASC LIMIT 1
-            """, (system_voltage, voltage_upper_bound))
-            
-            bat_row = cur.fetchone()
-            
-            if bat_row:
-                bat_unit_price = float(bat_row[0])
-                bat_unit_kwh = float(bat_row[1])
-                bat_name = f"{bat_row[2]} {bat_row[3]} ({bat_row[4]}V)"
-                
-                # Recalculate quantity based on DoD adjusted requirement
-                num_batteries = math.ceil(required_battery_kwh / bat_unit_kwh)
-                cost_bat = num_batteries * bat_unit_price
-                total_bat_kwh = num_batteries * bat_unit_kwh
-            else:
-                num_batteries = 1
-                cost_bat = required_battery_kwh * 700000
-                total_bat_kwh = required_battery_kwh
-                bat_name = "Generic LiFePO4 Bank"
-
-            # 3. GET INSTALL COSTS
-            cur.execute("SELECT base_labor_mmk, accessory_kit_mmk, mounting_per_panel_mmk, cabinet_cost_mmk FROM ref_installation_costs WHERE voltage_tier = %s", (system_voltage,))
-            install_ref = cur.fetchone()
-            if not install_ref: install_ref = (100000, 200000, 40000, 0)
+    # STRATEGY A: MARKET PACKAGE
+    packages = [
+        p for p in get_rows("market_packages")
+        if p["inverter_watts"] >= inverter_required_w
+        and p["battery_kwh"] >= required_battery_kwh
+        and p["system_voltage"] == system_voltage
+    ]
+    # Logic: If user wants no_solar, but package has panels, we skip unless specific flag logic is added.
+    # Here we accept the package if it fits specs, assuming panels can be unbundled or user accepts.
+    if packages:
+        pkg = min(packages, key=lambda p: p["total_price_mmk"])
+        market_set_found = {
+            "name": pkg["name"],
+            "price": pkg["total_price_mmk"],
+            "desc": pkg["description"],
+            "inv_w": pkg["inverter_watts"],
+            "bat_kwh": pkg["battery_kwh"],
+            "has_panels": pkg["includes_panels"]
+        }
+
+    # STRATEGY B: CUSTOM BUILD
+
+    # 1. SNAP INVERTER
+    inverters = [
+        i for i in get_rows("products_inverters")
+        if i["system_voltage"] == system_voltage
+        and i["watts"] >= inverter_required_w
+        and i["max_ac_charge_amps"] >= min_charge_amps
+    ]
+
+    if inverters:
+        inv = min(inverters, key=lambda i: i["price_mmk"])
+        real_inverter = {
+            "watts": inv["watts"],
+            "price": float(inv["price_mmk"]),
+            "name": f"{inv['brand']} {inv['model']}",
+            "charge_amps": inv["max_ac_charge_amps"]
+        }
+    else:
+        real_inverter = {
+            "watts": inverter_required_w,
+            "price": inverter_required_w * 300, 
+            "name": "Industrial/Parallel Setup",
+            "charge_amps": 100
+        }
+
+    # 2. SNAP BATTERY
+    # [CORRECTION] Voltage Logic Fix:
+    # We strictly check voltage range to avoid 48V Battery on 24V Inverter.
+    voltage_upper_bound = system_voltage + 4 # Allow small variance (e.g. 51.2 vs 48)
+
+    batteries = [
+        b for b in get_rows("products_batteries")
+        if system_voltage <= b["volts"] < voltage_upper_bound
+        and b["tech_type"] == "LiFePO4"
+    ]
+
+    if batteries:
+        bat = min(batteries, key=lambda b: b["price_mmk"])
+        bat_unit_price = float(bat["price_mmk"])
+        bat_unit_kwh = float(bat["kwh"])
+        bat_name = f"{bat['brand']} {bat['model']} ({bat['volts']}V)"
+        
+        # Recalculate quantity based on DoD adjusted requirement
+        num_batteries = math.ceil(required_battery_kwh / bat_unit_kwh)
+        cost_bat = num_batteries * bat_unit_price
+        total_bat_kwh = num_batteries * bat_unit_kwh
+    else:
+        num_batteries = 1
+        cost_bat = required_battery_kwh * 700000
+        total_bat_kwh = required_battery_kwh
+        bat_name = "Generic LiFePO4 Bank"
+
+    # 3. GET INSTALL COSTS
+    install_ref = next(
+        ((r["base_labor_mmk"], r["accessory_kit_mmk"], r["mounting_per_panel_mmk"], r["cabinet_cost_mmk"])
+         for r in get_rows("ref_installation_costs") if r["voltage_tier"] == system_voltage),
+        None
+    )
+    if not install_ref: install_ref = (100000, 200000, 40000, 0)
 
     # --- 5. SOLAR CALCULATION ---
     num_panels = 0
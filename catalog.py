@@ -0,0 +1,114 @@
+import os
+import json
+import time
+import hashlib
+import threading
+import psycopg2
+from database import DB_URL, get_db_connection
+
+# The catalog is small (a few hundred rows), so it is held in memory as plain dicts.
+# Under gunicorn the master loads it once before forking (see gunicorn.conf.py) and
+# workers inherit it copy-on-write. Without a preload (uvicorn dev mode), each process
+# loads it on first use and re-reads it every CATALOG_TTL_SEC, so init_db.py changes show up.
+CATALOG_TTL_SEC = int(os.environ.get("CATALOG_TTL_SEC", 300))  # 0 = never re-read
+CATALOG_RETRY_SEC = 60  # After a failed DB load, don't retry (reconnect) more often than this
+
+# Tables (and columns) the bot reads at request time.
+CATALOG_TABLES = {
+    "products_inverters": ["brand", "model", "type", "watts", "system_voltage", "max_ac_charge_amps", "price_mmk", "tier", "notes"],
+    "products_batteries": ["brand", "model", "tech_type", "volts", "amp_hours", "kwh", "warranty_years", "cell_grade", "price_mmk", "tier", "notes"],
+    "products_solar_panels": ["brand", "model", "watts", "type", "price_mmk", "warranty_years"],
+    "products_commercial_bess": ["brand", "model", "kwh", "voltage_type", "price_mmk", "description"],
+    "products_portables": ["brand", "model", "watts", "kwh", "price_mmk", "description"],
+    "vendors": ["name", "category", "specialty", "known_brands"],
+    "ref_installation_costs": ["voltage_tier", "base_labor_mmk", "accessory_kit_mmk", "mounting_per_panel_mmk", "cabinet_cost_mmk"],
+    "market_packages": ["name", "inverter_watts", "battery_kwh", "system_voltage", "total_price_mmk", "includes_panels", "description"],
+}
+
+_catalog = None     # {"version", "tables", "loaded_at"}
+_preloaded = False  # Loaded by the gunicorn master: fixed until SIGHUP rolls the workers
+_failed_at = None
+_lock = threading.Lock()  # Background tasks run in a threadpool
+
+def _fetch_tables(cur):
+    """Reads every catalog table into {table: [row_dict, ...]}."""
+    tables = {}
+    for table, columns in CATALOG_TABLES.items():
+        order_by = "voltage_tier" if table == "ref_installation_costs" else "id"
+        cur.execute(f"SELECT {', '.join(columns)} FROM {table} ORDER BY {order_by}")
+        tables[table] = [dict(zip(columns, row)) for row in cur.fetchall()]
+    return tables
+
+def _make_catalog(tables):
+    blob = json.dumps(tables, sort_keys=True, ensure_ascii=False, default=float).encode("utf-8")
+    return {"version": hashlib.sha1(blob).hexdigest()[:12], "tables": tables, "loaded_at": time.monotonic()}
+
+def preload():
+    """
+    Loads the catalog in the gunicorn master, before the workers are forked.
+    Uses a one-off connection so no pool is opened in the master.
+    """
+    global _catalog, _preloaded, _failed_at
+    conn = psycopg2.connect(DB_URL)
+    try:
+        with conn.cursor() as cur:
+            tables = _fetch_tables(cur)
+    finally:
+        conn.close()
+    _catalog = _make_catalog(tables)
+    _preloaded = True
+    _failed_at = None
+    print(f"✅ Catalog preloaded (version {_catalog['version']})")
+    return _catalog["version"]
+
+def _is_fresh(catalog):
+    if catalog is None:
+        return False
+    if _preloaded or not CATALOG_TTL_SEC:
+        return True
+    return time.monotonic() - catalog["loaded_at"] < CATALOG_TTL_SEC
+
+def _current():
+    """Returns the catalog, (re)loading it via the pool when missing or past its TTL."""
+    global _catalog, _failed_at
+    catalog = _catalog
+    if _is_fresh(catalog):
+        return catalog
+    with _lock:
+        # Re-check: another thread may have reloaded it while we waited
+        catalog = _catalog
+        if _is_fresh(catalog):
+            return catalog
+        if _failed_at is not None and time.monotonic() - _failed_at < CATALOG_RETRY_SEC:
+            if catalog is not None:
+                return catalog
+            raise RuntimeError("Catalog unavailable (last load failed, retrying later)")
+        try:
+            with get_db_connection() as conn:
+                with conn.cursor() as cur:
+                    _catalog = _make_catalog(_fetch_tables(cur))
+            _failed_at = None
+            return _catalog
+        except Exception as e:
+            _failed_at = time.monotonic()
+            print(f"❌ Catalog unavailable, retrying in {CATALOG_RETRY_SEC}s: {e}")
+            # A stale catalog beats no catalog
+            if catalog is not None:
+                return catalog
+            raise
+
+def get_rows(table):
+    """Returns the catalog rows of `table` as a list of dicts. Treat them as read-only."""
+    return _current()["tables"][table]
+
+def catalog_version():
+    """Content hash of the catalog currently served by this process."""
+    return _current()["version"]
+
+def reset():
+    """Drops this process's catalog so the next read loads it again."""
+    global _catalog, _preloaded, _failed_at
+    with _lock:
+        _catalog = None
+        _preloaded = False
+        _failed_at = None
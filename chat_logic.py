@@ -3,13 +3,17 @@ import json
 import requests
 from database import save_chat_log, get_recent_history
 from calculator import calculate_system
+import admission
+import faq
 
 OPENROUTER_API_KEY = os.environ.get("OPENROUTER_API_KEY")
 ADMIN_FB_ID = os.environ.get("ADMIN_FB_ID")
 FB_ACCESS_TOKEN = os.environ.get("FACEBOOK_PAGE_ACCESS_TOKEN")
+LLM_TIMEOUT_SEC = float(os.environ.get("LLM_TIMEOUT_SEC", 45))  # Below gunicorn's worker timeout
+FB_TIMEOUT_SEC = 10
 
 # --- YOUR PERSONA DEFINITION ---
-PERSONA_DEFINITION = """
+PERSONA_CORE = """
 You are "MeeSaya" (မီးဆရာ), a wise, practical, and friendly male Myanmar Energy Consultant. 
 You are speaking to a local Myanmar citizen who speaks fluent Burmese.
 
@@ -18,12 +22,17 @@ You are speaking to a local Myanmar citizen who speaks fluent Burmese.
 - **Tone:** Friendly, humble, and practical. Like an engineer at a tea shop.
 - **Knowledge:** You know the grid is bad (Mee Pyat). You recommend "Fast Charging" (High Amps).
 
-**Market Knowledge (Q1 2025):**
+"""
+
+# Replaced by retrieved snippets when the FAQ index finds a relevant match (see faq.py)
+MARKET_KNOWLEDGE = """**Market Knowledge (Q1 2025):**
 - **Batteries:** 314Ah LiFePO4 is the new standard. Lead-Acid is bad.
 - **Inverters:** 6kW is standard for fast charging.
 - **Vendors:** Yoon Electronic (Cheap), Aether Solar (Quality).
 """
 
+PERSONA_DEFINITION = PERSONA_CORE + MARKET_KNOWLEDGE
+
 # --- INSTRUCTIONS TO FORCE BURMESE & PREVENT TRANSLATION ---
 SYSTEM_INSTRUCTIONS = """
 **CRITICAL OUTPUT RULES (MUST FOLLOW):**
@@ -57,12 +66,130 @@ def send_fb_message(recipient_id, text):
         "message": {"text": text}
     }
     try:
-        r = requests.post("https://graph.facebook.com/v19.0/me/messages", params=params, headers=headers, json=data)
+        r = requests.post("https://graph.facebook.com/v19.0/me/messages", params=params, headers=headers, json=data, timeout=FB_TIMEOUT_SEC)
         if r.status_code != 200:
             print(f"Error sending FB message: {r.text}")
     except Exception as e:
         print(f"Connection error sending FB message: {e}")
 
+def send_overload_reply(sender_id, decision):
+    """Sends the canned reply for a turned-away message (at most once per cooldown)."""
+    reply = admission.overload_reply(sender_id, decision)
+    if reply:
+        send_fb_message(sender_id, reply)
+
+def build_messages(history, user_text, snippets=None):
+    """Assembles the exact prompt sent to the LLM for one turn."""
+    if snippets:
+        # Only the retrieved facts, instead of the whole market knowledge block
+        knowledge = "**Relevant Market Knowledge:**\n" + "\n".join(f"- {s}" for s in snippets) + "\n"
+        system_prompt = PERSONA_CORE + knowledge + "\n" + SYSTEM_INSTRUCTIONS
+    else:
+        system_prompt = FINAL_SYSTEM_PROMPT
+    system_message = {"role": "system", "content": system_prompt}
+    return [system_message] + history + [{"role": "user", "content": user_text}]
+
+def route_message(history, user_text):
+    """
+    Checks the local FAQ index before involving the LLM.
+    Returns (direct_reply, messages): direct_reply is set on a high-confidence FAQ hit,
+    otherwise messages is the prompt to send (with top snippets on a partial hit).
+    """
+    try:
+        match = faq.lookup(user_text, history)
+    except Exception as e:
+        print(f"FAQ lookup error: {e}")
+        match = None
+
+    if match and match["mode"] == "direct":
+        return match["answer"], None
+    snippets = match["snippets"] if match else None
+    return None, build_messages(history, user_text, snippets)
+
+def call_llm(messages):
+    """Calls Google Gemini 2.5 Flash via OpenRouter and returns the reply text."""
+    response = requests.post(
+        "https://openrouter.ai/api/v1/chat/completions",
+        headers={
+            "Authorization": f"Bearer {OPENROUTER_API_KEY}",
+            "HTTP-Referer": "https://meesaya.com", 
+        },
+        json={
+            # USING THE SPECIFIC MODEL REQUESTED
+            "model": "google/gemini-2.5-flash", 
+            "messages": messages,
+            "temperature": 0.3 # Low temp for strict instruction following
+        },
+        timeout=LLM_TIMEOUT_SEC
+    )
+    result = response.json()
+    
+    if 'choices' not in result:
+        print(f"LLM Error: {result}")
+        # Fallback if 2.5 isn't available yet or error occurs
+        raise ValueError(f"Invalid LLM Response: {result}")
+
+    return result['choices'][0]['message']['content']
+
+def format_system_quote(calc_result):
+    """Renders calculate_system() output as the engineer's quote (in Burmese)."""
+    specs = calc_result['system_specs']
+    ests = calc_result['estimates']
+    
+    # --- ENGINEER'S QUOTE (IN BURMESE) ---
+    reply_text = (
+        f"မီးဆရာရဲ့ တွက်ချက်မှုအရ အစ်ကို့အတွက် အသင့်တော်ဆုံး System ကတော့ -\n\n"
+        f"🔌 System: {specs['system_voltage']}V Architecture\n"
+        f"⚡ Inverter: {specs['inverter']} ({specs['inverter_size_kw']}kW)\n"
+        f"🔋 Battery: {specs['battery_qty']} လုံး x {specs['battery_model']} (စုစုပေါင်း {specs['total_storage_kwh']}kWh)\n"
+    )
+    
+    if specs['solar_panels_count'] > 0:
+        reply_text += f"☀️ Solar: {specs['solar_panels_count']} ချပ်\n"
+    
+    reply_text += (
+        f"\n💰 ခန့်မှန်းကုန်ကျစရိတ်: {ests['total_estimated']:,} ကျပ်\n"
+        f"(စက်ပစ္စည်း၊ လက်ခ၊ ကြိုး၊ မီးပုံး အပြီးအစီး ခန့်မှန်းဈေးဖြစ်ပါတယ်ခင်ဗျ)"
+    )
+    return reply_text
+
+def resolve_reply(ai_content):
+    """
+    Turns raw LLM output into the reply the user sees, running the calculator on tool triggers.
+    Returns (reply_text, outcome) where outcome["type"] is one of
+    "text", "tool", "tool_parse_error" (bad/incomplete JSON) or "calc_error" (calculate_system raised).
+    """
+    reply_text = ai_content 
+    outcome = {"type": "text"}
+    tool_error_reply = "မီးသုံးစွဲမှု တွက်ချက်ရာမှာ Error ဖြစ်သွားလို့ ပမာဏအတိအကျ (Watts) နဲ့ ပြန်ပြောပေးပါခင်ဗျာ။"
+    
+    # Check for Tool Trigger
+    if "{" in ai_content and "calculate" in ai_content:
+        try:
+            # Extract JSON cleanly
+            start = ai_content.find("{")
+            end = ai_content.rfind("}") + 1
+            json_str = ai_content[start:end]
+            data = json.loads(json_str)
+            if data.get("tool") != "calculate":
+                return reply_text, outcome
+            args = (data['watts'], data['hours'], data.get('no_solar', False))
+        except Exception as e:
+            print(f"Tool parse error: {e}")
+            return tool_error_reply, {"type": "tool_parse_error", "error": f"{type(e).__name__}: {e}"}
+
+        try:
+            # --- EXECUTE PYTHON CALCULATION ---
+            calc_result = calculate_system(*args)
+            reply_text = format_system_quote(calc_result)
+            outcome = {"type": "tool", "args": data, "result": calc_result}
+        except Exception as e:
+            print(f"Calculator error: {e}")
+            reply_text = tool_error_reply
+            outcome = {"type": "calc_error", "args": data, "error": f"{type(e).__name__}: {e}"}
+
+    return reply_text, outcome
+
 def process_ai_message(sender_id, user_text):
     """
     1. Retrieve History
@@ -71,72 +198,31 @@ def process_ai_message(sender_id, user_text):
     4. Save & Reply
     """
     
-    # 1. Get Context
+    # 1. Get Context (before this turn is saved, so it isn't in the history twice)
     history = get_recent_history(sender_id, limit=6)
-    
-    system_message = {"role": "system", "content": FINAL_SYSTEM_PROMPT}
-    messages = [system_message] + history + [{"role": "user", "content": user_text}]
 
-    # 2. Call LLM
+    # 2. Call LLM (unless the FAQ index can answer directly)
     try:
-        response = requests.post(
-            "https://openrouter.ai/api/v1/chat/completions",
-            headers={
-                "Authorization": f"Bearer {OPENROUTER_API_KEY}",
-                "HTTP-Referer": "https://meesaya.com", 
-            },
-            json={
-                # USING THE SPECIFIC MODEL REQUESTED
-                "model": "google/gemini-2.5-flash", 
-                "messages": messages,
-                "temperature": 0.3 # Low temp for strict instruction following
-            }
-        )
-        result = response.json()
-        
-        if 'choices' not in result:
-            print(f"LLM Error: {result}")
-            # Fallback if 2.5 isn't available yet or error occurs
-            raise ValueError(f"Invalid LLM Response: {result}")
-
-        ai_content = result['choices'][0]['message']['content']
-        reply_text = ai_content 
-        
-        # 3. Check for Tool Trigger
-        if "{" in ai_content and "calculate" in ai_content:
+        direct_reply, messages = route_message(history, user_text)
+        if direct_reply:
+            save_chat_log(sender_id, "user", user_text)
+            reply_text = direct_reply
+        else:
+            # An LLM slot is held only for the call itself. If none is free, the message
+            # is turned away without a trace: no user row, and the sender's token is refunded.
+            slot = admission.acquire_slot()
+            if slot is None:
+                admission.refund(sender_id)
+                send_overload_reply(sender_id, admission.OVERLOADED)
+                return
             try:
-                # Extract JSON cleanly
-                start = ai_content.find("{")
-                end = ai_content.rfind("}") + 1
-                json_str = ai_content[start:end]
-                data = json.loads(json_str)
-                
-                if data.get("tool") == "calculate":
-                    # --- EXECUTE PYTHON CALCULATION ---
-                    calc_result = calculate_system(data['watts'], data['hours'], data.get('no_solar', False))
-                    
-                    specs = calc_result['system_specs']
-                    ests = calc_result['estimates']
-                    
-                    # --- ENGINEER'S QUOTE (IN BURMESE) ---
-                    reply_text = (
-                        f"မီးဆရာရဲ့ တွက်ချက်မှုအရ အစ်ကို့အတွက် အသင့်တော်ဆုံး System ကတော့ -\n\n"
-                        f"🔌 System: {specs['system_voltage']}V Architecture\n"
-                        f"⚡ Inverter: {specs['inverter']} ({specs['inverter_size_kw']}kW)\n"
-                        f"🔋 Battery: {specs['battery_qty']} လုံး x {specs['battery_model']} (စုစုပေါင်း {specs['total_storage_kwh']}kWh)\n"
-                    )
-                    
-                    if specs['solar_panels_count'] > 0:
-                        reply_text += f"☀️ Solar: {specs['solar_panels_count']} ချပ်\n"
-                    
-                    reply_text += (
-                        f"\n💰 ခန့်မှန်းကုန်ကျစရိတ်: {ests['total_estimated']:,} ကျပ်\n"
-                        f"(စက်ပစ္စည်း၊ လက်ခ၊ ကြိုး၊ မီးပုံး အပြီးအစီး ခန့်မှန်းဈေးဖြစ်ပါတယ်ခင်ဗျ)"
-                    )
-                    
-            except Exception as e:
-                print(f"Tool parse error: {e}")
-                reply_text = "မီးသုံးစွဲမှု တွက်ချက်ရာမှာ Error ဖြစ်သွားလို့ ပမာဏအတိအကျ (Watts) နဲ့ ပြန်ပြောပေးပါခင်ဗျာ။"
+                save_chat_log(sender_id, "user", user_text)
+                ai_content = call_llm(messages)
+            finally:
+                admission.release(slot)
+            
+            # 3. Check for Tool Trigger
+            reply_text, _ = resolve_reply(ai_content)
         
         # 4. Save AI Response (Memory)
         save_chat_log(sender_id, "assistant", reply_text)
@@ -147,4 +233,4 @@ def process_ai_message(sender_id, user_text):
     except Exception as e:
         print(f"Critical AI Error: {e}")
         error_msg = "System error ဖြစ်နေလို့ ခဏနေမှ ပြန်မေးပေးပါခင်ဗျာ။ 🙏"
-        send_fb_message(sender_id, error_msg)
\ No newline at end of file
+        send_fb_message(sender_id, error_msg)
@@ -1,4 +1,5 @@
 import os
+import threading
 import psycopg2
 from psycopg2 import pool
 from contextlib import contextmanager
@@ -6,17 +7,44 @@ from contextlib import contextmanager
 # Get URL
 DB_URL = os.environ.get("DATABASE_URL")
 
-# Initialize Connection Pool
-try:
-    connection_pool = psycopg2.pool.SimpleConnectionPool(1, 10, DB_URL)
-    if connection_pool:
-        print("✅ Database connection pool created successfully")
-except Exception as e:
-    print(f"❌ Error creating connection pool: {e}")
+# Connection Pool (created lazily, once per process)
+# NOTE: Under gunicorn the master forks workers. A pool opened before the fork
+# would share sockets between processes, so each worker opens its own on first use.
+_connection_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()  # Background tasks run in a threadpool
+DB_POOL_MAX = int(os.environ.get("DB_POOL_MAX", 5))  # Per process: total = workers x DB_POOL_MAX
+
+def get_connection_pool():
+    """Returns this process's pool, creating it on first use (after fork)."""
+    global _connection_pool, _pool_pid
+    if _connection_pool is not None and _pool_pid == os.getpid():
+        return _connection_pool
+    with _pool_lock:
+        # Re-check: another thread may have created it while we waited
+        if _connection_pool is None or _pool_pid != os.getpid():
+            try:
+                _connection_pool = psycopg2.pool.SimpleConnectionPool(1, DB_POOL_MAX, DB_URL)
+                _pool_pid = os.getpid()
+                print(f"✅ Database connection pool created successfully (pid {_pool_pid})")
+            except Exception as e:
+                print(f"❌ Error creating connection pool: {e}")
+                raise
+        return _connection_pool
+
+def close_connection_pool():
+    """Closes this process's pool (called on worker exit)."""
+    global _connection_pool, _pool_pid
+    with _pool_lock:
+        if _connection_pool is not None and _pool_pid == os.getpid():
+            _connection_pool.closeall()
+        _connection_pool = None
+        _pool_pid = None
 
 @contextmanager
 def get_db_connection():
     """Yields a connection from the pool and ensures it's returned."""
+    connection_pool = get_connection_pool()
     conn = connection_pool.getconn()
     try:
         yield conn
@@ -0,0 +1,270 @@
+import os
+import re
+import math
+import threading
+from collections import Counter
+import catalog
+
+# --- CONFIDENCE THRESHOLDS ---
+# Confidence = best BM25 score / the best score any document could get for this query (0..1).
+FAQ_DIRECT_CONFIDENCE = float(os.environ.get("FAQ_DIRECT_CONFIDENCE", 0.5))   # answer without the LLM
+FAQ_SNIPPET_CONFIDENCE = float(os.environ.get("FAQ_SNIPPET_CONFIDENCE", 0.25))  # send only top snippets to the LLM
+FAQ_TOP_SNIPPETS = 3
+# Short follow-ups ("ဘယ်လောက်လဲ") depend on the conversation, so they never get a canned answer
+# once there is history; the LLM sees the context instead.
+FAQ_SHORT_MESSAGE_CHARS = 30
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+
+# --- CURATED ANSWERS (Burmese) ---
+# "questions" are only used for matching; "answer" is sent verbatim on a direct hit.
+# "entities": a direct answer also needs one of these in the message (e.g. the vendor name),
+# so a generic question that happens to score well can't trigger it.
+CURATED_FAQ = [
+    {
+        "id": "vendor_yoon",
+        "entities": ["yoon"],
+        "questions": [
+            "Yoon Electronic က ဘယ်လိုလဲ",
+            "Yoon ဆိုင်က ဈေးသက်သာလား",
+            "ဈေးသက်သာတဲ့ဆိုင် ဘယ်မှာဝယ်ရမလဲ",
+            "yoon electronic shop cheap price list",
+        ],
+        "answer": (
+            "Yoon Electronic ကတော့ Cash & Carry ဆိုင်ပါ။ ပစ္စည်းစုံပြီး ဈေးသက်သာပါတယ်ခင်ဗျာ။ "
+            "Felicity, Lvtopsun, Deye, Bicodi စတဲ့ Brand တွေ ရနိုင်ပါတယ်။ "
+            "တပ်ဆင်မှု အကြံဉာဏ် လိုရင်တော့ Engineering ဆိုင်တွေနဲ့ တိုင်ပင်တာ ပိုကောင်းပါတယ်ခင်ဗျာ။"
+        ),
+    },
+    {
+        "id": "vendor_aether",
+        "entities": ["aether"],
+        "questions": [
+            "Aether Solar က ဘယ်လိုလဲ",
+            "Aether Solar Engineering ကောင်းလား",
+            "Quality ကောင်းတဲ့ဆိုင် ဘယ်ဆိုင်လဲ",
+            "aether solar engineering quality grade a",
+        ],
+        "answer": (
+            "Aether Solar Engineering ကတော့ Engineering ဘက်ကို အဓိကထားတဲ့ ကုမ္ပဏီပါ။ "
+            "Grade A Cell ဟုတ်မဟုတ် စစ်ပေးတာ၊ နည်းပညာ ရှင်းပြပေးတာ ကောင်းပါတယ်ခင်ဗျာ။ "
+            "ဈေးနည်းနည်း ပိုပေမယ့် Quality ကို ဦးစားပေးချင်ရင် သင့်တော်ပါတယ်ခင်ဗျာ။"
+        ),
+    },
+    {
+        "id": "lifepo4_vs_lead_acid",
+        "entities": ["lead acid", "ခဲအိုး"],
+        "questions": [
+            "ခဲအိုး Battery နဲ့ LiFePO4 ဘာကွာလဲ",
+            "Lead Acid ဝယ်ရမလား လစ်သီယမ် ဝယ်ရမလား",
+            "ခဲအိုးက ဈေးသက်သာတယ် ကောင်းလား",
+            "lead acid vs lifepo4 lithium battery difference",
+        ],
+        "answer": (
+            "Lead-Acid (ခဲအိုး) Battery က ၅၀% လောက်ပဲ စိတ်ချရရ သုံးလို့ရပြီး သက်တမ်းလည်း တိုပါတယ်ခင်ဗျာ။ "
+            "LiFePO4 ကတော့ ၉၀% လောက်အထိ သုံးလို့ရတယ်၊ အားသွင်းတာ မြန်တယ်၊ သက်တမ်းလည်း အများကြီး ပိုခံပါတယ်။ "
+            "အခု ဈေးကွက်မှာ 314Ah LiFePO4 က Standard ဖြစ်နေပါပြီခင်ဗျာ။"
+        ),
+    },
+    {
+        "id": "battery_314ah",
+        "entities": ["314ah", "314"],
+        "questions": [
+            "314Ah Battery က ဘယ်လိုလဲ",
+            "314Ah LiFePO4 ကောင်းလား ဘယ် Brand ယူရမလဲ",
+            "16kWh battery 314ah 51.2V warranty",
+        ],
+        "answer": (
+            "314Ah (51.2V, 16kWh) LiFePO4 က အခု ဈေးကွက်မှာ အရောင်းရဆုံး Battery ပါခင်ဗျာ။ "
+            "EVE Grade A Cell နဲ့ Warranty ၁၀ နှစ်ပေးတဲ့ Brand တွေ ရှိပါတယ်။ "
+            "6kW Inverter နဲ့ တွဲသုံးရင် 1HP Aircon တစ်လုံးကို နာရီအတော်ကြာ မောင်းနိုင်ပါတယ်ခင်ဗျာ။"
+        ),
+    },
+    {
+        "id": "fast_charging",
+        "entities": ["charging", "charge", "အားသွင်း"],
+        "questions": [
+            "မီးလာချိန်နည်းတယ် အားသွင်းတာ မြန်ချင်တယ်",
+            "Battery အမြန်အားသွင်းလို့ရလား",
+            "မီးလာတာ ၃ နာရီပဲ အားပြည့်မလား",
+            "fast charging ac charge amps inverter",
+        ],
+        "answer": (
+            "မီးလာချိန် နည်းတဲ့အတွက် AC Charging Amps များတဲ့ Inverter ကို ရွေးဖို့ အရေးကြီးပါတယ်ခင်ဗျာ။ "
+            "48V 6kW Inverter တွေက 100A ကနေ 120A အထိ အားသွင်းနိုင်လို့ "
+            "၃-၄ နာရီ မီးလာချိန်အတွင်း Battery ပြည့်အောင် သွင်းနိုင်ပါတယ်ခင်ဗျာ။"
+        ),
+    },
+]
+
+# A stated load ("500W", "1HP", "2kW") belongs to the calculator tool, never to a canned answer.
+LOAD_PATTERN = re.compile(r"\d+(?:\.\d+)?\s*(?:kw|w|watts?|hp)\b", re.IGNORECASE)
+# Asking where / how much / how to reach someone wants a concrete detail the curated answers
+# don't hold. The question words are STOPWORDS, so they never lower the match score by themselves.
+DETAIL_PATTERN = re.compile(
+    r"ဘယ်မှာ|ဘယ်နား|ဘယ်နေရာ|လိပ်စာ|ဘယ်လောက်|ဈေးနှုန်း|ဖုန်း|ဆက်သွယ်"
+    r"|\b(?:where|address|location|how much|price|cost|phone|contact)\b",
+    re.IGNORECASE,
+)
+
+# --- TOKENIZER ---
+# Burmese has no spaces between words, so Myanmar runs are split into syllables
+# (a break before every consonant that isn't stacked/killed), then syllable bigrams
+# are added to approximate words. Latin/digit runs are lower-cased words.
+_LATIN_RUN = re.compile(r"[a-z0-9]+(?:\.[0-9]+)?")
+_MYANMAR_RUN = re.compile(r"[က-၉၌-႟]+")  # Stops at ၊ and ။ (sentence punctuation)
+_SYLLABLE_BREAK = re.compile(r"(?<!္)([က-အ])(?![်္])|([ဣ-ဧဩဪဿ၌-၏])")
+
+# Question particles, politeness markers and filler that carry no topic.
+# Dropped from documents and queries alike, so they never add to a score.
+STOPWORDS = {
+    # Burmese syllables
+    "ဘယ်", "လို", "လဲ", "လား", "သလဲ", "ဘာ", "ကောင်း", "က", "ကို", "မှာ", "နဲ့", "တဲ့", "တယ်", "ပါ",
+    "ရ", "မ", "ပဲ", "လည်း", "တော့", "ရင်", "ဖို့", "တွေ", "ဆို", "ဟုတ်", "ချင်", "ပေး", "ဒါ", "ဟာ",
+    "ယူ", "ဝယ်", "ခင်", "ဗျာ", "ဗျ", "ရှင်", "ရှင့်", "နော်",
+    # English
+    "a", "an", "the", "is", "are", "vs", "how", "what", "which", "good", "for", "to", "of", "and",
+    "or", "it", "i", "my", "do", "does", "can",
+}
+
+def syllables(text):
+    """Splits a run of Myanmar script into syllables."""
+    return _SYLLABLE_BREAK.sub(r" \1\2", text).split()
+
+def tokenize(text):
+    text = text.lower().replace("\u200b", "")
+    tokens = [w for w in _LATIN_RUN.findall(text) if w not in STOPWORDS]
+    for run in _MYANMAR_RUN.findall(text):
+        sylls = syllables(run)
+        tokens.extend(s for s in sylls if s not in STOPWORDS)
+        # A bigram with a particle in it ("ကောင်းလား") is no more topical than the particle
+        tokens.extend(a + b for a, b in zip(sylls, sylls[1:]) if a not in STOPWORDS and b not in STOPWORDS)
+    return tokens
+
+# --- INDEX ---
+class BM25Index:
+    """In-memory Okapi BM25 over a small document set."""
+    def __init__(self, docs):
+        self.docs = docs
+        self.doc_tfs = [Counter(tokenize(d["text"])) for d in docs]
+        self.doc_lens = [sum(tf.values()) for tf in self.doc_tfs]
+        self.avg_len = (sum(self.doc_lens) / len(docs)) if docs else 0.0
+        df = Counter(term for tf in self.doc_tfs for term in tf)
+        n = len(docs)
+        self.idf = {term: math.log(1 + (n - freq + 0.5) / (freq + 0.5)) for term, freq in df.items()}
+
+    def search(self, query, k=FAQ_TOP_SNIPPETS):
+        """Returns (confidence, [(score, doc), ...]) for the top k documents."""
+        terms = [t for t in set(tokenize(query)) if t in self.idf]
+        if not terms:
+            return 0.0, []
+
+        scored = []
+        for doc, tf, length in zip(self.docs, self.doc_tfs, self.doc_lens):
+            score = 0.0
+            for term in terms:
+                f = tf.get(term, 0)
+                if f:
+                    score += self.idf[term] * f * (K1 + 1) / (f + K1 * (1 - B + B * length / self.avg_len))
+            if score > 0:
+                scored.append((score, doc))
+        scored.sort(key=lambda s: s[0], reverse=True)
+
+        # Upper bound: every query term present, saturated, in a short document.
+        # Terms unknown to the index still count, so off-topic words lower confidence.
+        all_terms = set(tokenize(query))
+        max_idf = max(self.idf.values())
+        ceiling = sum(self.idf.get(t, max_idf) for t in all_terms) * (K1 + 1)
+        confidence = scored[0][0] / ceiling if scored else 0.0
+        return confidence, scored[:k]
+
+def _catalog_docs():
+    """Catalog rows as retrievable snippets (English, like the persona's market notes)."""
+    docs = []
+    for v in catalog.get_rows("vendors"):
+        docs.append({
+            "id": f"vendor:{v['name']}", "kind": "catalog",
+            "text": f"{v['name']} {v['category']} {v['specialty']} {v['known_brands']}",
+            "snippet": f"Vendor {v['name']} ({v['category']}): {v['specialty']}. Brands: {v['known_brands']}.",
+        })
+    for b in catalog.get_rows("products_batteries"):
+        docs.append({
+            "id": f"battery:{b['brand']} {b['model']}", "kind": "catalog",
+            "text": f"battery {b['brand']} {b['model']} {b['tech_type']} {b['amp_hours']}ah {b['volts']}v {b['kwh']}kwh {b['cell_grade']} {b['notes']}",
+            "snippet": (f"Battery {b['brand']} {b['model']}: {b['tech_type']} {b['volts']}V {b['amp_hours']}Ah ({b['kwh']}kWh), "
+                        f"{b['warranty_years']}Y warranty, ~{b['price_mmk']:,} MMK. {b['notes']}"),
+        })
+    for i in catalog.get_rows("products_inverters"):
+        docs.append({
+            "id": f"inverter:{i['brand']} {i['model']}", "kind": "catalog",
+            "text": f"inverter {i['brand']} {i['model']} {i['type']} {i['watts']}w {i['system_voltage']}v {i['max_ac_charge_amps']}a charging {i['notes']}",
+            "snippet": (f"Inverter {i['brand']} {i['model']}: {i['watts']}W {i['system_voltage']}V {i['type']}, "
+                        f"{i['max_ac_charge_amps']}A AC charging, ~{i['price_mmk']:,} MMK. {i['notes']}"),
+        })
+    return docs
+
+def _curated_docs():
+    return [
+        {"id": f["id"], "kind": "curated", "text": " ".join(f["questions"]), "snippet": f["answer"], "answer": f["answer"],
+         "entities": [set(tokenize(e)) for e in f["entities"]]}
+        for f in CURATED_FAQ
+    ]
+
+# Per-process state
+_lock = threading.Lock()
+_index = None
+_index_version = None
+
+def get_index():
+    """
+    Returns the index, (re)building it when the catalog changes.
+    The version check is an in-memory lookup; catalog.py re-reads the DB only when its TTL expires.
+    While the catalog is unavailable, catalog.py caches the failure, so this doesn't reconnect per message.
+    """
+    global _index, _index_version
+    try:
+        version = catalog.catalog_version()
+    except Exception:
+        version = None
+
+    with _lock:
+        if _index is None or version != _index_version:
+            docs = _curated_docs() + (_catalog_docs() if version else [])
+            _index = BM25Index(docs)
+            _index_version = version
+            print(f"✅ FAQ index built: {len(docs)} docs (catalog {version})")
+        return _index
+
+def _has_prior_reply(history):
+    return any(m["role"] == "assistant" for m in history or [])
+
+def lookup(user_text, history=None):
+    """
+    Routes a user message:
+      {"mode": "direct", "answer": ...}     -> reply without the LLM
+      {"mode": "snippets", "snippets": [...]} -> LLM with only these facts as market knowledge
+      None                                  -> full persona prompt
+    """
+    confidence, hits = get_index().search(user_text)
+    if not hits:
+        return None
+
+    top_doc = hits[0][1]
+    query_tokens = set(tokenize(user_text))
+    direct = (
+        confidence >= FAQ_DIRECT_CONFIDENCE
+        and top_doc["kind"] == "curated"
+        and any(entity <= query_tokens for entity in top_doc["entities"])
+        and not LOAD_PATTERN.search(user_text)
+        and not DETAIL_PATTERN.search(user_text)
+        and not (len(user_text.strip()) <= FAQ_SHORT_MESSAGE_CHARS and _has_prior_reply(history))
+    )
+    if direct:
+        return {"mode": "direct", "answer": top_doc["answer"], "doc_id": top_doc["id"], "confidence": confidence}
+
+    if confidence >= FAQ_SNIPPET_CONFIDENCE:
+        return {"mode": "snippets", "snippets": [d["snippet"] for _, d in hits], "confidence": confidence}
+
+    return None
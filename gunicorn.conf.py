@@ -0,0 +1,46 @@
+import os
+import multiprocessing
+
+# Production serving mode: gunicorn master + uvicorn workers.
+# Run with: gunicorn main:app -c gunicorn.conf.py
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 8000)}"
+worker_class = "uvicorn.workers.UvicornWorker"
+# Bounded default: cpu_count() reports host cores inside containers, and every
+# worker opens its own DB pool (DB_POOL_MAX connections each, see database.py).
+workers = int(os.environ.get("WEB_CONCURRENCY", min(multiprocessing.cpu_count(), 4)))
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 60))
+graceful_timeout = 30
+keepalive = 5
+
+# Import the app once in the master, so forked workers start (and restart) warm.
+# Safe because database.py opens its pool lazily, per worker, after the fork.
+# Also required by admission.py, whose shared-memory rate limits are allocated at import.
+preload_app = True
+
+def on_starting(server):
+    """Pre-fork warmup: load the catalog once; workers inherit it copy-on-write."""
+    import gc
+    import catalog
+    try:
+        catalog.preload()
+    except Exception as e:
+        # Workers fall back to loading the catalog themselves.
+        print(f"❌ Catalog preload failed, workers will load from DB: {e}")
+    # Keep the collector from touching (and so copying) the inherited objects in each worker.
+    gc.freeze()
+
+def on_reload(server):
+    """SIGHUP (e.g. after re-running init_db.py): reload the catalog for the new workers."""
+    on_starting(server)
+
+def worker_exit(server, worker):
+    from database import close_connection_pool
+    close_connection_pool()
+
+def child_exit(server, worker):
+    """Runs in the master after any worker exits, including SIGKILL, timeouts and OOM kills."""
+    import admission
+    freed = admission.reclaim(worker.pid)
+    if freed:
+        print(f"⚠️ Reclaimed {freed} LLM slot(s) from worker {worker.pid}")
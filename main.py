@@ -1,11 +1,22 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request, HTTPException, BackgroundTasks
 from fastapi.responses import PlainTextResponse
-from chat_logic import process_ai_message
-from database import save_chat_log
+from chat_logic import process_ai_message, send_overload_reply
+import admission
+import faq
 import os
 import uvicorn
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app):
+    # Runs in each worker after the fork; rebuilt later when the catalog version changes.
+    try:
+        faq.get_index()
+    except Exception as e:
+        print(f"❌ FAQ index warmup failed: {e}")
+    yield
+
+app = FastAPI(lifespan=lifespan)
 
 VERIFY_TOKEN = os.environ.get("FACEBOOK_VERIFY_TOKEN")
 
@@ -13,6 +24,10 @@ VERIFY_TOKEN = os.environ.get("FACEBOOK_VERIFY_TOKEN")
 def home():
     return {"status": "MeeSaya Bot Active (Q1 2025)"}
 
+@app.get("/admission")
+def admission_stats():
+    return admission.stats()
+
 @app.get("/webhook")
 async def verify_webhook(request: Request):
     params = request.query_params
@@ -35,12 +50,15 @@ async def handle_messages(request: Request, background_tasks: BackgroundTasks):
             if "text" in message and not message.get("is_echo"):
                 user_text = message["text"]
                 
-                # FIX: Save User Log immediately (sync call wrapped or accepted if fast enough)
-                # Ideally, this should also be offloaded if DB is slow, 
-                # but for simplicity we keep it here to ensure order.
-                save_chat_log(sender_id, "user", user_text)
+                # Admission Control: per-sender token bucket + global cap on in-flight LLM calls.
+                # Rejected messages get a canned reply; no DB write, no OpenRouter call.
+                decision = admission.admit(sender_id)
+                if decision != admission.ADMITTED:
+                    background_tasks.add_task(send_overload_reply, sender_id, decision)
+                    continue
                 
-                # Background processing triggers the AI -> DB -> FB loop
+                # Background processing triggers the AI -> DB -> FB loop.
+                # The user row is saved there, once the message is sure to be answered.
                 background_tasks.add_task(process_ai_message, sender_id, user_text)
             
     return {"status": "ok"}
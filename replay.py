@@ -0,0 +1,280 @@
+"""
+Offline Conversation Replay (Prompt Regression Testing)
+
+Re-runs historical conversations through the same FAQ routing, prompt assembly and
+tool parsing as process_ai_message, in parallel across a process pool, without touching Facebook.
+
+Usage:
+    python replay.py --source db --backend fake
+    python replay.py --source export.jsonl --backend recorded --store responses.jsonl
+    python replay.py --source db --backend openrouter --record-to responses.jsonl --limit 50
+    python replay.py --source db --export export.jsonl      # dump chat_history to a file
+"""
+import os
+import re
+import sys
+import json
+import time
+import hashlib
+import argparse
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+import chat_logic
+from database import get_db_connection
+
+# Matches process_ai_message: get_recent_history(sender_id, limit=6)
+HISTORY_LIMIT = 6
+
+# ==========================================
+# 1. CONVERSATION SOURCES
+# ==========================================
+
+def load_from_db():
+    """Reads chat_history as rows ordered per user, oldest first."""
+    with get_db_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("""
+                SELECT user_id, role, message_text, timestamp FROM chat_history
+                ORDER BY user_id, timestamp, id
+            """)
+            return [
+                {"user_id": r[0], "role": r[1], "message_text": r[2], "timestamp": r[3].isoformat() if r[3] else None}
+                for r in cur.fetchall()
+            ]
+
+def load_from_file(path):
+    """Reads an export file: one chat_history row per line (JSONL)."""
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def group_conversations(rows):
+    """Groups rows into {user_id: [{"role", "content"}, ...]} in chronological order."""
+    conversations = defaultdict(list)
+    for row in sorted(rows, key=lambda r: (str(r["user_id"]), r.get("timestamp") or "")):
+        role = "user" if row["role"] == "user" else "assistant"
+        conversations[row["user_id"]].append({"role": role, "content": row["message_text"]})
+    return conversations
+
+# ==========================================
+# 2. LLM BACKENDS
+# ==========================================
+
+def prompt_key(messages):
+    """Stable key for a prompt, used by the recorded-response store."""
+    blob = json.dumps(messages, ensure_ascii=False, sort_keys=True).encode("utf-8")
+    return hashlib.sha1(blob).hexdigest()
+
+class FakeBackend:
+    """
+    Deterministic local stand-in for the LLM.
+    Emits a calculate tool call when the user states a load, plain Burmese text otherwise.
+    """
+    WATTS_RE = re.compile(r"(\d+(?:\.\d+)?)\s*(kw|w|watts?|hp)\b", re.IGNORECASE)
+    HOURS_RE = re.compile(r"(\d+(?:\.\d+)?)\s*(?:hours?|hrs?|h\b|နာရီ)", re.IGNORECASE)
+    NO_SOLAR_WORDS = ("condo", "apartment", "room", "ကွန်ဒို", "တိုက်ခန်း")
+
+    def complete(self, messages):
+        text = messages[-1]["content"]
+        match = self.WATTS_RE.search(text)
+        if not match:
+            return "ဟုတ်ကဲ့ခင်ဗျာ။ ဘယ်လိုပစ္စည်းတွေ သုံးမှာလဲ ပြောပြပေးပါခင်ဗျာ။"
+
+        value, unit = float(match.group(1)), match.group(2).lower()
+        watts = value * 1000 if unit == "kw" else value * 750 if unit == "hp" else value
+        hours_match = self.HOURS_RE.search(text)
+        hours = float(hours_match.group(1)) if hours_match else 4
+        no_solar = any(w in text.lower() for w in self.NO_SOLAR_WORDS)
+        return json.dumps({"tool": "calculate", "watts": int(watts), "hours": hours, "no_solar": no_solar})
+
+class StoreMiss(KeyError):
+    """The recorded store has no response for this exact prompt."""
+
+class RecordedBackend:
+    """
+    Serves responses from a store of recorded LLM outputs (JSONL of {"key", "content"}).
+    A miss is reported as its own outcome: chat_history holds the post-processed reply
+    (e.g. the formatted quote), not the raw LLM output, so it can't stand in for one.
+    """
+    def __init__(self, store_path):
+        self.store = {}
+        if store_path and os.path.exists(store_path):
+            for record in load_from_file(store_path):
+                self.store[record["key"]] = record["content"]
+
+    def complete(self, messages):
+        content = self.store.get(prompt_key(messages))
+        if content is None:
+            raise StoreMiss("No recorded response for prompt")
+        return content
+
+class OpenRouterBackend:
+    """The live model, exactly as production calls it (costs money)."""
+    def complete(self, messages):
+        return chat_logic.call_llm(messages)
+
+def make_backend(name, store_path=None):
+    if name == "fake":
+        return FakeBackend()
+    if name == "recorded":
+        return RecordedBackend(store_path)
+    if name == "openrouter":
+        return OpenRouterBackend()
+    raise ValueError(f"Unknown backend: {name}")
+
+# ==========================================
+# 3. REPLAY (runs inside pool workers)
+# ==========================================
+
+_backend = None
+
+def _init_worker(backend_name, store_path):
+    global _backend
+    _backend = make_backend(backend_name, store_path)
+
+def replay_conversation(item):
+    """Replays every user turn of one conversation. Returns a list of per-turn results."""
+    user_id, turns = item
+    results = []
+    for i, turn in enumerate(turns):
+        if turn["role"] != "user":
+            continue
+
+        # process_ai_message reads history before saving this turn
+        history = turns[max(0, i - HISTORY_LIMIT):i]
+        started = time.perf_counter()
+        direct_reply, messages = chat_logic.route_message(history, turn["content"])
+
+        if direct_reply:
+            result = {"user_id": user_id, "turn": i, "key": None, "content": None, "outcome": "faq_direct",
+                      "latency_ms": (time.perf_counter() - started) * 1000}
+            results.append(result)
+            continue
+
+        result = {"user_id": user_id, "turn": i, "key": prompt_key(messages)}
+        try:
+            ai_content = _backend.complete(messages)
+            reply_text, outcome = chat_logic.resolve_reply(ai_content)
+            result.update({
+                "content": ai_content,
+                "outcome": outcome["type"],
+                "error": outcome.get("error"),
+                "system_voltage": outcome["result"]["system_specs"]["system_voltage"] if outcome["type"] == "tool" else None,
+                "total_estimated": outcome["result"]["estimates"]["total_estimated"] if outcome["type"] == "tool" else None,
+            })
+        except StoreMiss:
+            result.update({"content": None, "outcome": "store_miss", "error": None})
+        except Exception as e:
+            result.update({"content": None, "outcome": "llm_error", "error": f"{type(e).__name__}: {e}"})
+        result["latency_ms"] = (time.perf_counter() - started) * 1000
+        results.append(result)
+    return results
+
+# ==========================================
+# 4. REPORT
+# ==========================================
+
+def summarize(results, elapsed):
+    outcomes = Counter(r["outcome"] for r in results)
+    llm_turns = len(results) - outcomes["faq_direct"]
+    answered = llm_turns - outcomes["llm_error"] - outcomes["store_miss"]
+    tool_attempts = outcomes["tool"] + outcomes["tool_parse_error"] + outcomes["calc_error"]
+    extracted = outcomes["tool"] + outcomes["calc_error"]
+    latencies = sorted(r["latency_ms"] for r in results)
+
+    return {
+        "turns": len(results),
+        "conversations": len({r["user_id"] for r in results}),
+        "outcomes": dict(outcomes),
+        "faq_direct_rate": round(outcomes["faq_direct"] / len(results), 4) if results else 0.0,
+        "store_miss_rate": round(outcomes["store_miss"] / llm_turns, 4) if llm_turns else 0.0,
+        "tool_call_rate": round(tool_attempts / answered, 4) if answered else 0.0,
+        "tool_extraction_success_rate": round(extracted / tool_attempts, 4) if tool_attempts else 0.0,
+        "calculate_success_rate": round(outcomes["tool"] / extracted, 4) if extracted else 0.0,
+        "calculate_by_voltage": dict(Counter(r["system_voltage"] for r in results if r["outcome"] == "tool")),
+        "top_errors": Counter(r["error"] for r in results if r.get("error")).most_common(5),
+        "elapsed_s": round(elapsed, 2),
+        "turns_per_s": round(len(results) / elapsed, 1) if elapsed else 0.0,
+        "p50_turn_ms": round(latencies[len(latencies) // 2], 2) if latencies else 0.0,
+        "p99_turn_ms": round(latencies[int(len(latencies) * 0.99)], 2) if latencies else 0.0,
+    }
+
+def print_report(report):
+    print("📊 Replay Report")
+    print(f"   Conversations: {report['conversations']}  |  Turns: {report['turns']}")
+    print(f"   Outcomes: {report['outcomes']}")
+    print(f"   FAQ direct answers: {report['faq_direct_rate']:.1%}")
+    print(f"   Recorded-store misses: {report['store_miss_rate']:.1%}")
+    print(f"   Tool-call rate: {report['tool_call_rate']:.1%}  |  Extraction success: {report['tool_extraction_success_rate']:.1%}"
+          f"  |  calculate_system success: {report['calculate_success_rate']:.1%}")
+    print(f"   calculate_system by voltage: {report['calculate_by_voltage']}")
+    for error, count in report["top_errors"]:
+        print(f"   ❌ {count}x {error}")
+    print(f"   ⏱  {report['elapsed_s']}s  ({report['turns_per_s']} turns/s, p50 {report['p50_turn_ms']}ms, p99 {report['p99_turn_ms']}ms)")
+
+# ==========================================
+# 5. CLI
+# ==========================================
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay historical conversations against a pluggable LLM backend.")
+    parser.add_argument("--source", default="db", help="'db' for chat_history, or a JSONL export file")
+    parser.add_argument("--backend", default="fake", choices=["fake", "recorded", "openrouter"])
+    parser.add_argument("--store", help="Recorded-response store (JSONL) for --backend recorded")
+    parser.add_argument("--record-to", help="Append backend responses to this store (JSONL)")
+    parser.add_argument("--export", help="Write the source rows to this JSONL file and exit")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--limit", type=int, help="Replay at most N conversations")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args(argv)
+
+    rows = load_from_db() if args.source == "db" else load_from_file(args.source)
+
+    if args.export:
+        with open(args.export, "w", encoding="utf-8") as f:
+            for row in rows:
+                f.write(json.dumps(row, ensure_ascii=False) + "\n")
+        print(f"✅ Exported {len(rows)} rows to {args.export}")
+        return 0
+
+    conversations = list(group_conversations(rows).items())
+    if args.limit:
+        conversations = conversations[:args.limit]
+
+    # Pre-fork warmup: load the catalog once so forked workers inherit it
+    # instead of each opening its own DB pool (see catalog.py).
+    import catalog
+    try:
+        catalog.preload()
+    except Exception as e:
+        print(f"❌ Catalog preload failed, calculate_system may error: {e}")
+
+    started = time.perf_counter()
+    results = []
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker,
+                             initargs=(args.backend, args.store)) as pool:
+        chunksize = max(1, len(conversations) // (args.workers * 4 or 1))
+        for turn_results in pool.map(replay_conversation, conversations, chunksize=chunksize):
+            results.extend(turn_results)
+    elapsed = time.perf_counter() - started
+
+    # Only fresh backend output is recorded; replaying a store never writes back into one.
+    if args.record_to and args.backend != "recorded":
+        with open(args.record_to, "a", encoding="utf-8") as f:
+            for r in results:
+                if r["content"] is not None:
+                    f.write(json.dumps({"key": r["key"], "content": r["content"]}, ensure_ascii=False) + "\n")
+
+    report = summarize(results, elapsed)
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    else:
+        print_report(report)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,146 @@
+import os
+import ctypes
+import pytest
+import admission
+import chat_logic
+
+SHARED = [admission._keys, admission._tokens, admission._updated, admission._notified_at,
+          admission._slot_pids, admission._counters]
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture(autouse=True)
+def clock(monkeypatch):
+    """Empty shared state, fixed limits and a clock the test advances by hand."""
+    for array in SHARED:
+        ctypes.memset(ctypes.addressof(array), 0, ctypes.sizeof(array))
+    monkeypatch.setattr(admission, "SENDER_BURST", 3.0)
+    monkeypatch.setattr(admission, "SENDER_RATE_PER_MIN", 6.0)  # one token every 10s
+    clock = Clock()
+    monkeypatch.setattr(admission.time, "monotonic", clock)
+    return clock
+
+def fill_slots():
+    return [admission.acquire_slot() for _ in range(len(admission._slot_pids))]
+
+# --- Token bucket ---
+
+def test_burst_then_refill(clock):
+    assert [admission.admit("a") for _ in range(4)] == [admission.ADMITTED] * 3 + [admission.RATE_LIMITED]
+    clock.now += 10
+    assert admission.admit("a") == admission.ADMITTED
+    assert admission.admit("a") == admission.RATE_LIMITED
+    # Senders don't share buckets
+    assert admission.admit("b") == admission.ADMITTED
+
+def test_refill_is_capped_at_burst(clock):
+    admission.admit("a")
+    clock.now += 3600
+    assert [admission.admit("a") for _ in range(4)] == [admission.ADMITTED] * 3 + [admission.RATE_LIMITED]
+
+def test_colliding_sender_does_not_get_a_fresh_burst(monkeypatch):
+    monkeypatch.setattr(admission, "_slot", lambda sender_id: (7, hash(sender_id) | 1))
+    for _ in range(3):
+        admission.admit("a")
+    assert admission.admit("b") == admission.RATE_LIMITED
+
+# --- In-flight cap ---
+
+def test_overloaded_does_not_spend_a_token():
+    slots = fill_slots()
+    assert admission.acquire_slot() is None
+    assert [admission.admit("a") for _ in range(5)] == [admission.OVERLOADED] * 5
+    for slot in slots:
+        admission.release(slot)
+    assert [admission.admit("a") for _ in range(3)] == [admission.ADMITTED] * 3
+
+def test_refund_after_acquire_slot_fails():
+    for _ in range(3):
+        assert admission.admit("a") == admission.ADMITTED
+    slots = fill_slots()
+    assert admission.acquire_slot() is None
+    admission.refund("a")
+    for slot in slots:
+        admission.release(slot)
+    assert admission.admit("a") == admission.ADMITTED
+    assert admission.admit("a") == admission.RATE_LIMITED
+
+def test_reclaim_frees_a_dead_workers_slots():
+    fill_slots()
+    assert admission.stats()["in_flight"] == len(admission._slot_pids)
+    assert admission.reclaim(os.getpid() + 1) == 0
+    assert admission.reclaim(os.getpid()) == len(admission._slot_pids)
+    stats = admission.stats()
+    assert stats["in_flight"] == 0
+    assert stats["reclaimed"] == len(admission._slot_pids)
+
+def test_release_ignores_a_reclaimed_slot():
+    slot = admission.acquire_slot()
+    admission.reclaim(os.getpid())
+    admission._slot_pids[slot] = os.getpid() + 1  # reused by another worker
+    admission.release(slot)
+    assert admission._slot_pids[slot] == os.getpid() + 1
+
+# --- Notices ---
+
+@pytest.mark.parametrize("decision, reply", [
+    (admission.RATE_LIMITED, admission.RATE_LIMITED_REPLY),
+    (admission.OVERLOADED, admission.OVERLOADED_REPLY),
+])
+def test_notice_cooldown(clock, decision, reply):
+    assert admission.overload_reply("a", decision) == reply
+    assert admission.overload_reply("a", decision) is None
+    assert admission.overload_reply("b", decision) == reply
+    clock.now += admission.NOTICE_COOLDOWN_SEC
+    assert admission.overload_reply("a", decision) == reply
+    assert admission.stats()["notices_sent"] == 3
+
+def test_stats_counts_decisions():
+    for _ in range(4):
+        admission.admit("a")
+    stats = admission.stats()
+    assert stats[admission.ADMITTED] == 3
+    assert stats[admission.RATE_LIMITED] == 1
+    assert stats["tracked_senders"] == 1
+    assert stats["in_flight"] == 0
+
+# --- process_ai_message ---
+
+@pytest.fixture
+def chat(monkeypatch):
+    """Records DB writes and Facebook sends instead of performing them."""
+    calls = {"saved": [], "sent": [], "llm": 0}
+    monkeypatch.setattr(chat_logic, "get_recent_history", lambda sender_id, limit=6: [])
+    monkeypatch.setattr(chat_logic, "save_chat_log", lambda *row: calls["saved"].append(row))
+    monkeypatch.setattr(chat_logic, "send_fb_message", lambda sender_id, text: calls["sent"].append(text))
+    monkeypatch.setattr(chat_logic, "route_message", lambda history, text: (None, [{"role": "user", "content": text}]))
+
+    def call_llm(messages):
+        calls["llm"] += 1
+        calls["in_flight"] = admission.stats()["in_flight"]
+        return "ဟုတ်ကဲ့ခင်ဗျာ"
+    monkeypatch.setattr(chat_logic, "call_llm", call_llm)
+    return calls
+
+def test_slot_is_held_only_during_the_llm_call(chat):
+    chat_logic.process_ai_message("a", "hello")
+    assert chat["in_flight"] == 1
+    assert admission.stats()["in_flight"] == 0
+    assert chat["saved"] == [("a", "user", "hello"), ("a", "assistant", "ဟုတ်ကဲ့ခင်ဗျာ")]
+
+def test_turned_away_message_leaves_no_trace(chat):
+    admission.admit("a")
+    fill_slots()
+    chat_logic.process_ai_message("a", "hello")
+    assert chat["llm"] == 0
+    assert chat["saved"] == []
+    assert chat["sent"] == [admission.OVERLOADED_REPLY]
+    # The token spent in admit() was refunded
+    assert [admission.admit("a") for _ in range(3)] == [admission.OVERLOADED] * 3
+    admission.reclaim(os.getpid())
+    assert [admission.admit("a") for _ in range(4)] == [admission.ADMITTED] * 3 + [admission.RATE_LIMITED]
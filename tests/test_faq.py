@@ -0,0 +1,97 @@
+import pytest
+import faq
+import chat_logic
+
+HISTORY = [
+    {"role": "user", "content": "Aircon 1HP နဲ့ ရေခဲသေတ္တာ"},
+    {"role": "assistant", "content": "မီးဆရာရဲ့ တွက်ချက်မှုအရ ..."},
+]
+
+@pytest.fixture(autouse=True)
+def curated_index(monkeypatch):
+    """Curated answers only, so routing doesn't depend on a database."""
+    index = faq.BM25Index(faq._curated_docs())
+    monkeypatch.setattr(faq, "get_index", lambda: index)
+    return index
+
+# --- Tokenizer ---
+
+def test_syllables_split_burmese_run():
+    assert faq.syllables("မင်္ဂလာပါ") == ["မင်္ဂ", "လာ", "ပါ"]
+    assert faq.syllables("အားသွင်း") == ["အား", "သွင်း"]
+
+def test_tokenize_adds_bigrams_and_lowercases_latin():
+    tokens = faq.tokenize("Yoon ခဲအိုး 314Ah")
+    assert "yoon" in tokens
+    assert "314ah" in tokens
+    assert {"ခဲ", "အိုး", "ခဲအိုး"} <= set(tokens)
+
+def test_tokenize_drops_particles_and_their_bigrams():
+    assert faq.tokenize("ဘယ်လိုလဲ") == []
+    assert faq.tokenize("ကောင်းလား") == []
+    assert faq.tokenize("is it good?") == []
+    tokens = faq.tokenize("ဈေးသက်သာလား")
+    assert "လား" not in tokens and "သာလား" not in tokens
+    assert "ဈေးသက်" in tokens
+
+def test_tokenize_ignores_punctuation_and_zero_width_space():
+    assert faq.tokenize("အား\u200bသွင်း။") == faq.tokenize("အားသွင်း")
+
+# --- Routing ---
+
+@pytest.mark.parametrize("text, doc_id", [
+    ("Yoon ဆိုင်က ဈေးသက်သာလား", "vendor_yoon"),
+    ("Aether Solar ကောင်းလား", "vendor_aether"),
+    ("ခဲအိုး နဲ့ LiFePO4 ဘာကွာလဲ", "lifepo4_vs_lead_acid"),
+    ("314Ah ဘယ် brand ကောင်းလဲ", "battery_314ah"),
+])
+def test_direct_answer_for_entity_question(text, doc_id):
+    match = faq.lookup(text)
+    assert match["mode"] == "direct"
+    assert match["doc_id"] == doc_id
+
+@pytest.mark.parametrize("text", ["ဘယ်လိုလဲ", "ကောင်းလား", "ဈေးသက်သာလား", "battery"])
+def test_generic_question_never_gets_direct_answer(text):
+    match = faq.lookup(text)
+    assert match is None or match["mode"] != "direct"
+
+@pytest.mark.parametrize("text", [
+    "Yoon ဆိုင် ဘယ်မှာလဲ",
+    "Aether Solar ဖုန်းနံပါတ် ရနိုင်မလား",
+    "314Ah battery ဘယ်လောက်လဲ",
+    "Where is the Yoon shop?",
+])
+def test_question_asking_for_a_detail_goes_to_llm(text):
+    match = faq.lookup(text)
+    assert match is None or match["mode"] != "direct"
+
+def test_short_follow_up_with_history_goes_to_llm():
+    match = faq.lookup("Aether Solar ကောင်းလား", HISTORY)
+    assert match is None or match["mode"] != "direct"
+
+def test_long_question_with_history_can_still_be_direct():
+    match = faq.lookup("lead acid battery vs lifepo4 difference?", HISTORY)
+    assert match["mode"] == "direct"
+    assert match["doc_id"] == "lifepo4_vs_lead_acid"
+
+def test_stated_load_is_never_answered_directly():
+    match = faq.lookup("314Ah battery နဲ့ 500W ဘယ်နှနာရီ ခံမလဲ")
+    assert match is None or match["mode"] != "direct"
+
+def test_route_message_direct_skips_llm():
+    reply, messages = chat_logic.route_message([], "Aether Solar ကောင်းလား")
+    assert reply == faq.lookup("Aether Solar ကောင်းလား")["answer"]
+    assert messages is None
+
+def test_route_message_generic_follow_up_builds_prompt():
+    reply, messages = chat_logic.route_message(HISTORY, "ဘယ်လိုလဲ")
+    assert reply is None
+    assert messages[0]["content"] == chat_logic.FINAL_SYSTEM_PROMPT
+    assert messages[-1] == {"role": "user", "content": "ဘယ်လိုလဲ"}
+
+def test_route_message_partial_match_sends_snippets_only():
+    reply, messages = chat_logic.route_message(HISTORY, "battery")
+    assert reply is None
+    system_prompt = messages[0]["content"]
+    assert "Relevant Market Knowledge" in system_prompt
+    assert chat_logic.MARKET_KNOWLEDGE not in system_prompt
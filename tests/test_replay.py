@@ -0,0 +1,132 @@
+import json
+import pytest
+import faq
+import chat_logic
+import replay
+
+QUOTE_RESULT = {
+    "system_specs": {
+        "system_voltage": 48, "inverter": "Growatt 6kW", "inverter_size_kw": 6.0,
+        "battery_qty": 1, "battery_model": "314Ah LiFePO4", "total_storage_kwh": 16.0,
+        "solar_panels_count": 0,
+    },
+    "estimates": {"total_estimated": 5000000},
+}
+
+EXPORT = [
+    {"user_id": "u2", "role": "user", "message_text": "Aether Solar ကောင်းလား", "timestamp": "2025-01-01T10:00:00"},
+    {"user_id": "u1", "role": "assistant", "message_text": "ဟုတ်ကဲ့ခင်ဗျာ", "timestamp": "2025-01-01T09:00:01"},
+    {"user_id": "u1", "role": "user", "message_text": "မင်္ဂလာပါ", "timestamp": "2025-01-01T09:00:00"},
+    {"user_id": "u1", "role": "user", "message_text": "Aircon 1500W 4 hours", "timestamp": "2025-01-01T09:01:00"},
+    {"user_id": "u1", "role": "user", "message_text": "Aether Solar ကောင်းလား", "timestamp": "2025-01-01T09:02:00"},
+]
+
+@pytest.fixture(autouse=True)
+def offline(monkeypatch):
+    """Curated FAQ only and a canned calculator, so replay needs no database."""
+    index = faq.BM25Index(faq._curated_docs())
+    monkeypatch.setattr(faq, "get_index", lambda: index)
+
+    def calculate_system(watts, hours, no_solar=False):
+        if watts > 100000:
+            raise ValueError("No inverter large enough")
+        return QUOTE_RESULT
+    monkeypatch.setattr(chat_logic, "calculate_system", calculate_system)
+
+def run(monkeypatch, backend, turns, user_id="u1"):
+    monkeypatch.setattr(replay, "_backend", backend)
+    return replay.replay_conversation((user_id, turns))
+
+# --- Sources ---
+
+def test_group_conversations_orders_turns_per_user():
+    conversations = replay.group_conversations(EXPORT)
+    assert [t["content"] for t in conversations["u1"]] == [
+        "မင်္ဂလာပါ", "ဟုတ်ကဲ့ခင်ဗျာ", "Aircon 1500W 4 hours", "Aether Solar ကောင်းလား",
+    ]
+    assert [t["role"] for t in conversations["u1"]] == ["user", "assistant", "user", "user"]
+    assert conversations["u2"] == [{"role": "user", "content": "Aether Solar ကောင်းလား"}]
+
+# --- Replay ---
+
+def test_history_is_the_turns_before_the_current_one(monkeypatch):
+    seen = []
+
+    class Capture:
+        def complete(self, messages):
+            seen.append(messages)
+            return "ok"
+
+    turns = replay.group_conversations(EXPORT)["u1"]
+    run(monkeypatch, Capture(), turns)
+    messages = seen[1]  # "Aircon 1500W 4 hours"
+    assert messages[-1] == {"role": "user", "content": "Aircon 1500W 4 hours"}
+    assert messages[1:-1] == turns[:2]
+
+def test_history_is_capped_at_production_limit(monkeypatch):
+    seen = []
+
+    class Capture:
+        def complete(self, messages):
+            seen.append(messages)
+            return "ok"
+
+    turns = [{"role": "user", "content": f"မေးခွန်း {n}"} for n in range(10)]
+    run(monkeypatch, Capture(), turns)
+    assert len(seen[-1]) == 1 + replay.HISTORY_LIMIT + 1
+
+def test_fake_backend_on_export(monkeypatch):
+    conversations = replay.group_conversations(EXPORT)
+    results = run(monkeypatch, replay.FakeBackend(), conversations["u1"])
+    # The Aether question is a short follow-up to an ongoing conversation, so it goes to the LLM
+    assert [r["outcome"] for r in results] == ["text", "tool", "text"]
+    assert results[1]["system_voltage"] == 48
+    assert results[1]["total_estimated"] == 5000000
+    assert json.loads(results[1]["content"])["watts"] == 1500
+
+    results = run(monkeypatch, replay.FakeBackend(), conversations["u2"], user_id="u2")
+    assert [r["outcome"] for r in results] == ["faq_direct"]
+
+def test_fake_backend_calc_error(monkeypatch):
+    results = run(monkeypatch, replay.FakeBackend(), [{"role": "user", "content": "500kW 4 hours"}])
+    assert results[0]["outcome"] == "calc_error"
+    assert "No inverter large enough" in results[0]["error"]
+
+def test_recorded_backend_hit_and_miss(tmp_path, monkeypatch):
+    turns = [{"role": "user", "content": "မင်္ဂလာပါ"}, {"role": "user", "content": "ဟုတ်ကဲ့"}]
+    _, messages = chat_logic.route_message([], turns[0]["content"])
+    store = tmp_path / "responses.jsonl"
+    store.write_text(json.dumps({"key": replay.prompt_key(messages), "content": "recorded"}) + "\n", encoding="utf-8")
+
+    results = run(monkeypatch, replay.RecordedBackend(str(store)), turns)
+    assert [r["outcome"] for r in results] == ["text", "store_miss"]
+    assert results[0]["content"] == "recorded"
+    assert results[1]["content"] is None
+
+# --- Report ---
+
+def test_summarize_rate_denominators():
+    outcomes = ["faq_direct", "text", "text", "tool", "tool", "tool_parse_error", "calc_error", "store_miss", "llm_error"]
+    results = [
+        {"user_id": f"u{n % 3}", "outcome": o, "latency_ms": float(n),
+         "system_voltage": 48 if o == "tool" else None, "error": "ValueError: x" if o == "calc_error" else None}
+        for n, o in enumerate(outcomes)
+    ]
+    report = replay.summarize(results, elapsed=1.0)
+    assert report["turns"] == 9
+    assert report["conversations"] == 3
+    assert report["faq_direct_rate"] == round(1 / 9, 4)
+    # Misses are out of the turns that needed the LLM (faq_direct excluded)
+    assert report["store_miss_rate"] == 0.125
+    # Tool calls are out of answered turns (no store_miss / llm_error)
+    assert report["tool_call_rate"] == round(4 / 6, 4)
+    # A calc_error still counts as a successful extraction
+    assert report["tool_extraction_success_rate"] == 0.75
+    assert report["calculate_success_rate"] == round(2 / 3, 4)
+    assert report["calculate_by_voltage"] == {48: 2}
+    assert report["top_errors"] == [("ValueError: x", 1)]
+
+def test_summarize_empty():
+    report = replay.summarize([], elapsed=0.0)
+    assert report["turns"] == 0
+    assert report["store_miss_rate"] == report["tool_call_rate"] == 0.0